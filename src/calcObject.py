@@ -1,8 +1,14 @@
 from calcInterface import CalculatorInterface
 from server import CalculatorObject
-from remote import RemoteObjectError
+from remote import RemoteObjectError, Rendezvous
 
 class calcObject(CalculatorInterface):
+    def __init__(self, ms_rendezvous_timeout=5000):
+        # CalculatorInterface.__init__ only declares the remote methods as None
+        # attributes, calling it would hide the implementations below.
+        # A caller that never gets a partner is released with an error
+        self.meeting = Rendezvous(2, ms_rendezvous_timeout)
+
     def add(self, a, b):
         co = CalculatorObject()
         co.total = a+b
@@ -46,11 +52,10 @@ class calcObject(CalculatorInterface):
         co = CalculatorObject()
         return co.val, None
     
+    # Blocks the calling thread until a partner arrives or the timeout passes,
+    # the service's named rendezvous points wait without holding a thread
     def rendezvous(self):
-        with self.lock:
-            if not self.wake:
-                self.wake = True
-                self.wg.wait()
-            else:
-                self.wg.set()
-        return RemoteObjectError()
\ No newline at end of file
+        _, err = self.meeting.wait()
+        if err:
+            return RemoteObjectError(err)
+        return None
\ No newline at end of file
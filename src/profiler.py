@@ -0,0 +1,179 @@
+import json
+import numbers
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+FORMATS = ("folded", "trace")
+
+class ProfileSample:
+    def __init__(self, scope, name):
+        self.scope = scope
+        self.name = name
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter()
+        self.phase = None
+        self.phase_start = self.start
+        self.phases = []
+        self.stacked = {}
+
+    # Close the running phase and open the next one, phases run back to back
+    def mark(self, phase):
+        now = time.perf_counter()
+        if self.phase:
+            self.phases.append((self.phase, self.phase_start, now))
+        self.phase = phase
+        self.phase_start = now
+
+    def finish(self):
+        self.mark(None)
+        self.end = self.phase_start
+
+
+class Profiler:
+    def __init__(self, scope, sample_rate=0.0, output=None, fmt="folded", ms_stack_interval=0, max_events=100_000):
+        self.scope = scope
+        self.sample_rate = sample_rate
+        self.output = output
+        self.fmt = fmt
+        self.ms_stack_interval = ms_stack_interval
+        self.epoch = time.perf_counter()
+        self.folded = {}
+        # only the most recent trace events are kept
+        self.events = deque(maxlen=max_events)
+        self.active = {}
+        self.sampler = None
+        self.mutex = threading.Lock()
+
+    # Decide whether to profile a request, callers only pay for a random draw
+    # when the sample rate is non zero
+    def sample(self, name=None):
+        if random.random() >= self.sample_rate:
+            return None
+
+        sample = ProfileSample(self.scope, name)
+        if self.ms_stack_interval:
+            with self.mutex:
+                self.active[sample.tid] = sample
+                if self.sampler is None:
+                    self.sampler = threading.Thread(target=self._sample_stacks, daemon=True)
+                    self.sampler.start()
+        return sample
+
+    def record(self, sample):
+        sample.finish()
+        name = sample.name or "unknown"
+        with self.mutex:
+            self.active.pop(sample.tid, None)
+            for phase, start, end in sample.phases:
+                # time already attributed to sampled stacks is not counted twice
+                key = f"{self.scope};{name};{phase}"
+                us = max(0, int((end - start) * 1_000_000) - sample.stacked.pop(phase, 0))
+                self.folded[key] = self.folded.get(key, 0) + us
+                if self.fmt == "trace":
+                    self.events.append(self._trace_event(phase, sample.tid, start, end, {"method": name}))
+
+            if self.fmt == "trace":
+                self.events.append(self._trace_event(f"{self.scope}:{name}", sample.tid, sample.start, sample.end, {}))
+
+    # While requests are being profiled periodically capture their stacks, so
+    # that time inside a phase such as lock waits in the method body or socket
+    # delays can be attributed to the frames that spent it
+    def _sample_stacks(self):
+        while True:
+            with self.mutex:
+                if not self.active or not self.ms_stack_interval:
+                    self.sampler = None
+                    return
+                interval = self.ms_stack_interval
+                active = list(self.active.values())
+
+            frames = sys._current_frames()
+            weight = int(interval * 1000)
+            with self.mutex:
+                for sample in active:
+                    frame = frames.get(sample.tid)
+                    if frame is None or sample.phase is None:
+                        continue
+
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    stack.reverse()
+
+                    key = ";".join([self.scope, sample.name or "unknown", sample.phase] + stack)
+                    self.folded[key] = self.folded.get(key, 0) + weight
+                    sample.stacked[sample.phase] = sample.stacked.get(sample.phase, 0) + weight
+
+                    # one event per frame over the same interval, which trace
+                    # viewers nest into a flame chart under the running phase
+                    if self.fmt == "trace":
+                        now = time.perf_counter()
+                        for name in stack:
+                            self.events.append(self._trace_event(name, sample.tid, now, now + interval / 1000, {"phase": sample.phase}))
+
+            time.sleep(interval / 1000)
+
+    def _trace_event(self, name, tid, start, end, args):
+        return {
+            "name": name,
+            "ph": "X",
+            "pid": os.getpid(),
+            "tid": tid,
+            "ts": int((start - self.epoch) * 1_000_000),
+            "dur": int((end - start) * 1_000_000),
+            "args": args,
+        }
+
+    def setProfiling(self, sample_rate, fmt=None, ms_stack_interval=None):
+        if isinstance(sample_rate, bool) or not isinstance(sample_rate, numbers.Real) or not 0 <= sample_rate <= 1:
+            raise ValueError(f"Sample rate {sample_rate} is not a number between 0 and 1")
+        if fmt is not None and fmt not in FORMATS:
+            raise ValueError(f"Unknown profile format {fmt}")
+        if ms_stack_interval is not None and (
+            isinstance(ms_stack_interval, bool) or not isinstance(ms_stack_interval, numbers.Real) or ms_stack_interval < 0
+        ):
+            raise ValueError(f"Stack interval {ms_stack_interval} is not a non negative number")
+
+        with self.mutex:
+            self.sample_rate = sample_rate
+            if fmt is not None:
+                self.fmt = fmt
+            if ms_stack_interval is not None:
+                self.ms_stack_interval = ms_stack_interval
+
+    def setOutput(self, output):
+        self.output = output
+
+    def getConfig(self):
+        return {
+            "rate": self.sample_rate,
+            "format": self.fmt,
+            "stack_interval": self.ms_stack_interval,
+            "output": self.output,
+        }
+
+    # Write everything collected so far, folded stacks weighted in microseconds
+    # or a trace event file that can be loaded into chrome://tracing
+    def flush(self):
+        if not self.output:
+            return None
+
+        with self.mutex:
+            if self.fmt == "trace":
+                data = json.dumps({"traceEvents": list(self.events)})
+            else:
+                data = "".join(f"{key} {value}\n" for key, value in self.folded.items())
+
+        try:
+            with open(self.output, "w") as f:
+                f.write(data)
+        except Exception as e:
+            print(f"Error writing profile: {str(e)}")
+            return e
+        return None
@@ -1,10 +1,14 @@
 import socket
+import queue
+import selectors
 import threading
 import time
 import random
 import json
 import inspect
 from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from profiler import Profiler
 
 class LeakySocket:
     def __init__(self, conn, lossy, delayed):
@@ -74,6 +78,215 @@ class LeakySocket:
         self.conn.close()
     
 
+# Service level methods that may be watched in addition to the object's methods
+SERVICE_METHODS = ("getCount", "isRunning")
+
+class Subscription:
+    def __init__(self, channel, key, method_name, method, args, ms_interval):
+        self.channel = channel
+        self.key = key
+        self.eval_key = (method_name, json.dumps(args))
+        self.method_name = method_name
+        self.method = method
+        self.args = args
+        self.ms_interval = ms_interval
+        self.last_value = None
+        self.has_value = False
+        self.last_sent = 0.0
+
+
+# A single client connection carrying any number of subscriptions, each one
+# tagged by the key the client chose for it
+class SubscriptionChannel:
+    def __init__(self, ls):
+        self.ls = ls
+        self.subs = {}
+        self.pending = {}
+        self.closed = False
+        self.mutex = threading.Lock()
+        # lets the publisher wake the writer while it waits on the client socket
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_w.setblocking(False)
+
+    # Hand a changed value to the writer, overwriting any value for the same key
+    # it has not sent yet so that a slow subscriber only receives the latest state
+    def offer(self, sub, value):
+        with self.mutex:
+            if self.closed or self.subs.get(sub.key) is not sub:
+                return
+            if sub.has_value and value == sub.last_value:
+                return
+            sub.last_value = value
+            sub.has_value = True
+            self.pending[sub.key] = value
+        self._wake()
+
+    # Report an error for a key that could not be subscribed
+    def reject(self, key, error):
+        with self.mutex:
+            self.pending[key] = (None, error)
+        self._wake()
+
+    def take(self):
+        with self.mutex:
+            pending = self.pending
+            self.pending = {}
+        return pending
+
+    # updates lost on the wire are resent on the next publish tick
+    def resend(self, keys):
+        with self.mutex:
+            for key in keys:
+                sub = self.subs.get(key)
+                if sub:
+                    sub.has_value = False
+                    sub.last_sent = 0.0
+
+    def _wake(self):
+        try:
+            self.wake_w.send(b"x")
+        except OSError:
+            # a wake up is already pending
+            pass
+
+    def close(self):
+        with self.mutex:
+            self.closed = True
+        self._wake()
+
+
+# Worker threads that evaluate watched methods. A worker stuck in a method that
+# overran its timeout is replaced, so stuck methods never use up the pool
+class EvaluatorPool:
+    def __init__(self, workers):
+        self.workers = workers
+        self.threads = 0
+        self.closed = False
+        self.tasks = queue.Queue()
+        self.mutex = threading.Lock()
+        for _ in range(workers):
+            self._spawn()
+
+    # must be called with the mutex held, except from the constructor
+    def _spawn(self):
+        self.threads += 1
+        threading.Thread(target=self._work, daemon=True).start()
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+
+            fn, args = task
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Evaluator error: {str(e)}")
+
+            # a worker that was replaced while stuck leaves once it gets free
+            with self.mutex:
+                if self.threads > self.workers:
+                    self.threads -= 1
+                    return
+
+    def submit(self, fn, *args):
+        if self.closed:
+            raise RuntimeError("EvaluatorPool is shut down")
+        self.tasks.put((fn, args))
+
+    # Called once for every evaluation that overran its timeout
+    def replace_stuck(self):
+        with self.mutex:
+            if not self.closed:
+                self._spawn()
+
+    def shutdown(self):
+        with self.mutex:
+            self.closed = True
+            threads = self.threads
+        for _ in range(threads):
+            self.tasks.put(None)
+
+
+class Rendezvous:
+    def __init__(self, parties, ms_timeout=None):
+        self.parties = parties
+        self.ms_timeout = ms_timeout
+        self.generation = 0
+        self.waiters = []
+        self.timer = None
+        self.mutex = threading.Lock()
+
+    # Register a participant for the current generation. The callback is kept
+    # instead of a blocked thread, and once the last participant arrives all
+    # of them are released together with the generation number they met in
+    def arrive(self, on_release, generation=None):
+        with self.mutex:
+            if generation is not None and generation != self.generation:
+                stale = True
+            else:
+                stale = False
+                self.waiters.append(on_release)
+                if len(self.waiters) < self.parties:
+                    if len(self.waiters) == 1 and self.ms_timeout:
+                        self.timer = threading.Timer(self.ms_timeout / 1000, self._expire, args=(self.generation,))
+                        self.timer.daemon = True
+                        self.timer.start()
+                    return
+                released, current = self._advance()
+
+        if stale:
+            on_release(None, f"Rendezvous generation {generation} is not the current generation")
+            return
+        self._broadcast(released, current, None)
+
+    # Block the calling thread until the current generation is released
+    def wait(self, generation=None):
+        done = threading.Event()
+        outcome = []
+
+        def release(generation, error):
+            outcome.append((generation, error))
+            done.set()
+
+        self.arrive(release, generation)
+        done.wait()
+        return outcome[0]
+
+    # Break a generation that did not fill up in time, releasing its waiters with an error
+    def _expire(self, generation):
+        with self.mutex:
+            if generation != self.generation:
+                return
+            released, _ = self._advance()
+        self._broadcast(released, None, f"Rendezvous generation {generation} timed out")
+
+    # Release everyone waiting in the current generation with an error
+    def abort(self, error):
+        with self.mutex:
+            released, _ = self._advance()
+        self._broadcast(released, None, error)
+
+    # must be called with the mutex held
+    def _advance(self):
+        released = self.waiters
+        generation = self.generation
+        self.waiters = []
+        self.generation += 1
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        return released, generation
+
+    def _broadcast(self, released, generation, error):
+        for on_release in released:
+            try:
+                on_release(generation, error)
+            except Exception as e:
+                print(f"Error releasing rendezvous participant: {str(e)}")
+
+
 class Service:
 
     def __init__(self, ifc, sobj, port, lossy, delayed):
@@ -87,25 +300,43 @@ class Service:
         self.delayed = delayed
         self.listener = None
         self.mutex = threading.Lock()
+        self.subscriptions = []
+        self.sub_mutex = threading.Lock()
+        self.ms_publish = 50
+        self.ms_eval_timeout = 1000
+        self.eval_workers = 8
+        self.evaluator = None
+        self.evaluating = {}
+        self.channels = set()
+        self.eval_mutex = threading.Lock()
+        self.rendezvous_points = {}
+        self.rendezvous_mutex = threading.Lock()
+        self.release_workers = 32
+        self.releaser = None
+        self.profiler = Profiler("service")
 
     def start(self):
-        self.mutex.Lock()
+        self.mutex.acquire()
         if self.running:
+            self.mutex.release()
             print("Service already running")
             return None
 
         try:
             self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.listener.bind(("", self.port))
-            self.listener.listen(5)
+            self.listener.listen(socket.SOMAXCONN)
             self.running = True
         except Exception as e:
-            self.mutex.Unlock()
+            self.mutex.release()
             print("Failed to start the listener")
             return e
         
-        self.mutex.Unlock()
+        self.mutex.release()
+        self.evaluator = EvaluatorPool(self.eval_workers)
+        self.releaser = ThreadPoolExecutor(max_workers=self.release_workers)
         threading.Thread(target=self._accept_connections, daemon=True).start()
+        threading.Thread(target=self._publish_updates, daemon=True).start()
         return None
     
     # have an infinite loop which keeps reading connections
@@ -122,42 +353,308 @@ class Service:
 	#  Stop on this Service, spawning a thread to handle each one
     def _handle_connections(self, conn):
         ls = LeakySocket(conn, self.lossy, self.delayed)
+        sample = None
         try:
-            input, err = ls.recieve_object()
-            if err:
+            sample = self.profiler.sample() if self.profiler.sample_rate else None
+            if sample:
+                sample.mark("recv")
+            success, input = ls.recieve_object()
+            if not success:
                 print("Error reading byteString from leaky socket")
                 return
             
-            req = json.loads(input.decode())
+            if sample:
+                sample.mark("decode")
+            # a subscription channel may send further messages right behind the first
+            line, _, rest = input.partition(b"\n")
+            req = json.loads(line.decode())
+            if "subscribe" in req:
+                # long lived subscriptions are not request latency, leave them out
+                sample = None
+                self._serve_channel(ls, req, rest)
+                return
+
+            # control and rendezvous requests are not remote calls, leave them out
+            if "control" in req:
+                sample = None
+                self._handle_control(ls, req)
+                return
+
+            if "rendezvous" in req:
+                sample = None
+                self._join_rendezvous(ls, req)
+                # the rendezvous now owns the connection and replies on release
+                ls = None
+                return
+
             method_name = req.get("method")
             args = req.get("args", [])
 
-            if not hasattr(self.object_val, method_name):
-                print(f"Method {method_name} not found")
-                return
-            
-            method = getattr(self.object_val, method_name)
-            if not callable(method):
-                print(f"{method_name} is not callable")
+            if sample:
+                sample.name = method_name
+                sample.mark("resolve")
+            method = self._resolve_method(method_name)
+            if method is None:
                 return
 
         
+            if sample:
+                sample.mark("call")
             try:
                 result = method(*args)
                 response = {"Result": result, "Error": None}
             except Exception as e:
                 response = {"Result": None, "Error": str(e)}
 
+            if sample:
+                sample.mark("send")
             ls.send_object(json.dumps(response).encode())
 
-            self.mutex.Lock()
-            self.call_count += 1
-            self.mutex.Unlock()
+            if sample:
+                sample.mark("count")
+            with self.mutex:
+                self.call_count += 1
 
         except Exception as e:
             print(f"Error handling connection: {str(e)}")
         finally:
-            ls.close()
+            if ls:
+                ls.close()
+            if sample:
+                self.profiler.record(sample)
+
+    # control requests adjust the running service instead of calling the object,
+    # currently only profiling can be changed this way
+    def _handle_control(self, ls, req):
+        control = req.get("control")
+        try:
+            if control != "profile":
+                raise ValueError(f"Unknown control {control}")
+
+            if "rate" in req:
+                self.profiler.setProfiling(req["rate"], req.get("format"), req.get("stack_interval"))
+            err = self.profiler.flush() if req.get("flush") else None
+            response = {"Result": self.profiler.getConfig(), "Error": str(err) if err else None}
+        except Exception as e:
+            response = {"Result": None, "Error": str(e)}
+
+        ls.send_object(json.dumps(response).encode())
+
+    # park the caller's connection on the named rendezvous, no handler thread
+    # is held while it waits for the other participants
+    def _join_rendezvous(self, ls, req):
+        name = req.get("rendezvous")
+        parties = req.get("parties", 2)
+        ms_timeout = req.get("timeout")
+
+        def reply(msg):
+            try:
+                # Try sending the reply until successful
+                while True:
+                    success, err = ls.send_object(msg)
+                    if err:
+                        print(f"Error releasing rendezvous participant: {err}")
+                        break
+                    if success:
+                        break
+            finally:
+                ls.close()
+
+        # sends are handed to the releaser pool so that a slow or lossy
+        # participant does not hold up the rest of the broadcast
+        def release(generation, error):
+            msg = json.dumps({"Result": generation, "Error": error}).encode()
+            try:
+                self.releaser.submit(reply, msg)
+            except RuntimeError:
+                # releaser was shut down by stop
+                reply(msg)
+
+        if isinstance(parties, bool) or not isinstance(parties, int) or parties < 1:
+            release(None, f"Rendezvous parties {parties} is not a positive integer")
+            return
+        if ms_timeout is not None and (isinstance(ms_timeout, bool) or not isinstance(ms_timeout, (int, float)) or ms_timeout < 0):
+            release(None, f"Rendezvous timeout {ms_timeout} is not a non negative number")
+            return
+
+        # the first caller fixes the settings of a name for the life of the service
+        with self.rendezvous_mutex:
+            rv = self.rendezvous_points.get(name)
+            if rv is None:
+                rv = Rendezvous(parties, ms_timeout)
+                self.rendezvous_points[name] = rv
+
+        if rv.parties != parties:
+            release(None, f"Rendezvous {name} expects {rv.parties} parties, not {parties}")
+            return
+        if rv.ms_timeout != ms_timeout:
+            release(None, f"Rendezvous {name} expects a timeout of {rv.ms_timeout} ms, not {ms_timeout}")
+            return
+
+        rv.arrive(release, req.get("generation"))
+
+    # look up a remote method on the service object, falling back to the
+    # service's own counters so that they can be watched by subscribers
+    def _resolve_method(self, method_name):
+        if hasattr(self.object_val, method_name):
+            method = getattr(self.object_val, method_name)
+        elif method_name in SERVICE_METHODS:
+            method = getattr(self, method_name)
+        else:
+            print(f"Method {method_name} not found")
+            return None
+
+        if not callable(method):
+            print(f"{method_name} is not callable")
+            return None
+        return method
+
+    # keep the connection open and serve all of the client's subscriptions on it,
+    # sending updates as newline delimited replies tagged with their key and
+    # reading subscribe/unsubscribe messages until the client hangs up
+    def _serve_channel(self, ls, req, buffer):
+        channel = SubscriptionChannel(ls)
+        selector = selectors.DefaultSelector()
+        selector.register(ls.conn, selectors.EVENT_READ)
+        selector.register(channel.wake_r, selectors.EVENT_READ)
+        with self.sub_mutex:
+            self.channels.add(channel)
+        try:
+            self._update_channel(channel, req)
+            while self.running and not channel.closed:
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    self._update_channel(channel, json.loads(line.decode()))
+
+                pending = channel.take()
+                if pending:
+                    updates = "".join(
+                        json.dumps({"Key": key, "Result": result, "Error": error}) + "\n"
+                        for key, (result, error) in pending.items()
+                    )
+                    success, err = ls.send_object(updates.encode())
+                    if err:
+                        print(f"Dropping subscriber: {err}")
+                        break
+                    if not success:
+                        channel.resend(pending.keys())
+
+                readable = [key.fileobj for key, _ in selector.select()]
+                if channel.wake_r in readable:
+                    channel.wake_r.recv(4096)
+                if ls.conn in readable:
+                    success, data = ls.recieve_object()
+                    if not success:
+                        # client closed the connection
+                        break
+                    buffer += data
+        finally:
+            channel.close()
+            selector.close()
+            channel.wake_r.close()
+            channel.wake_w.close()
+            with self.sub_mutex:
+                self.channels.discard(channel)
+                self.subscriptions = [sub for sub in self.subscriptions if sub.channel is not channel]
+
+    def _update_channel(self, channel, msg):
+        for spec in msg.get("subscribe", []):
+            key = spec.get("key")
+            method_name = spec.get("method")
+            ms_interval = spec.get("interval")
+            if ms_interval is None:
+                ms_interval = self.ms_publish
+            if isinstance(ms_interval, bool) or not isinstance(ms_interval, (int, float)) or ms_interval < 0:
+                channel.reject(key, f"Subscription interval {ms_interval} is not a non negative number")
+                continue
+
+            method = self._resolve_method(method_name)
+            if method is None:
+                channel.reject(key, f"Method {method_name} not found")
+                continue
+
+            sub = Subscription(channel, key, method_name, method, spec.get("args", []), max(ms_interval, self.ms_publish))
+            with channel.mutex:
+                channel.subs[key] = sub
+            with self.sub_mutex:
+                self.subscriptions = [s for s in self.subscriptions if s.channel is not channel or s.key != key]
+                self.subscriptions.append(sub)
+
+        for key in msg.get("unsubscribe", []):
+            with channel.mutex:
+                channel.subs.pop(key, None)
+                channel.pending.pop(key, None)
+            with self.sub_mutex:
+                self.subscriptions = [s for s in self.subscriptions if s.channel is not channel or s.key != key]
+
+    # once per tick hand every watched method whose subscribers are due to the
+    # evaluator pool, each method is evaluated once however many subscribers
+    # watch it and at most one evaluation per method is in flight, so a slow
+    # method only holds up its own subscribers and at worst costs one worker
+    def _publish_updates(self):
+        while self.running:
+            with self.sub_mutex:
+                subs = list(self.subscriptions)
+
+            now = time.monotonic()
+            due = {}
+            for sub in subs:
+                if now - sub.last_sent >= sub.ms_interval / 1000:
+                    due.setdefault(sub.eval_key, []).append(sub)
+
+            for eval_key, waiting in due.items():
+                with self.eval_mutex:
+                    inflight = self.evaluating.get(eval_key)
+                    if inflight is None:
+                        self.evaluating[eval_key] = {"started": now, "stuck": False}
+                    elif not inflight["stuck"] and now - inflight["started"] > self.ms_eval_timeout / 1000:
+                        inflight["stuck"] = True
+                        self.evaluator.replace_stuck()
+
+                if inflight is not None:
+                    if inflight["stuck"]:
+                        for sub in waiting:
+                            sub.channel.offer(sub, (None, f"Evaluation of {sub.method_name} timed out"))
+                    continue
+
+                for sub in waiting:
+                    sub.last_sent = now
+                try:
+                    self.evaluator.submit(self._evaluate, eval_key, waiting)
+                except RuntimeError:
+                    # evaluator was shut down by stop
+                    return
+
+            time.sleep(self.ms_publish / 1000)
+
+    def _evaluate(self, eval_key, waiting):
+        sub = waiting[0]
+        try:
+            result = sub.method(*sub.args)
+            json.dumps(result)
+            value = (result, None)
+        except Exception as e:
+            value = (None, str(e))
+        finally:
+            with self.eval_mutex:
+                self.evaluating.pop(eval_key, None)
+
+        for sub in waiting:
+            sub.channel.offer(sub, value)
+
+    def setPublishInterval(self, ms_publish):
+        self.ms_publish = ms_publish
+
+    # Subscribers of a method still being evaluated after ms_eval_timeout get an error
+    def setEvaluationTimeout(self, ms_eval_timeout):
+        self.ms_eval_timeout = ms_eval_timeout
+
+    # Profile a fraction of requests, timing each phase of the request path and
+    # optionally sampling stacks every ms_stack_interval milliseconds
+    def setProfiling(self, sample_rate, output=None, fmt=None, ms_stack_interval=None):
+        if output is not None:
+            self.profiler.setOutput(output)
+        self.profiler.setProfiling(sample_rate, fmt, ms_stack_interval)
 
     def getCount(self):
         return self.call_count
@@ -166,10 +663,10 @@ class Service:
         return self.running
     
     def stop(self):
-        self.mutex.Lock()
+        self.mutex.acquire()
         if not self.running:
             print("Service is not running")
-            self.mutex.Unlock()
+            self.mutex.release()
             return None
         
         self.running = False
@@ -177,7 +674,23 @@ class Service:
             self.listener.close()
             self.listener = None
         
-        self.mutex.Unlock()
+        self.mutex.release()
+
+        with self.sub_mutex:
+            channels = list(self.channels)
+        for channel in channels:
+            channel.close()
+        if self.evaluator:
+            self.evaluator.shutdown()
+
+        with self.rendezvous_mutex:
+            points = list(self.rendezvous_points.items())
+        for name, rv in points:
+            rv.abort(f"Rendezvous {name} aborted, service stopped")
+        if self.releaser:
+            self.releaser.shutdown(wait=False)
+
+        self.profiler.flush()
         return None
 
 class RemoteObjectError(Exception):
@@ -245,11 +758,196 @@ def newService(ifc, sobj, port, lossy, delayed):
 
     return serviceInstance, None
 
+class Subscriber:
+    def __init__(self, address, lossy, delayed):
+        self.address = address
+        self.lossy = lossy
+        self.delayed = delayed
+        self.ls = None
+        self.running = False
+        self.callbacks = {}
+        self.next_key = 0
+        self.mutex = threading.Lock()
+        self.send_mutex = threading.Lock()
 
+    # open the persistent connection that carries all of this client's subscriptions
+    def start(self):
+        try:
+            host, port = self.address.split(':')
+            conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            conn.connect((host, int(port)))
+        except Exception as e:
+            print(f"Connection error: {e}")
+            return e
+
+        self.ls = LeakySocket(conn, self.lossy, self.delayed)
+        err = self._send({"subscribe": []})
+        if err:
+            self.ls.close()
+            return err
+
+        self.running = True
+        threading.Thread(target=self._read_updates, daemon=True).start()
+        return None
 
+    # register interest in a method, the service then pushes its value to the
+    # callback every time it changes, at most once every ms_interval milliseconds
+    def watch(self, method_name, args, callback, ms_interval=None):
+        if not method_name or callback is None:
+            return None, ValueError("Watch called with wrong method & callback values")
+        if ms_interval is not None and (isinstance(ms_interval, bool) or not isinstance(ms_interval, (int, float)) or ms_interval < 0):
+            return None, ValueError(f"Subscription interval {ms_interval} is not a non negative number")
 
+        with self.mutex:
+            key = str(self.next_key)
+            self.next_key += 1
+            self.callbacks[key] = callback
 
+        err = self._send({"subscribe": [{"key": key, "method": method_name, "args": list(args), "interval": ms_interval}]})
+        if err:
+            with self.mutex:
+                self.callbacks.pop(key, None)
+            return None, err
+        return key, None
 
+    def unwatch(self, key):
+        with self.mutex:
+            self.callbacks.pop(key, None)
+        return self._send({"unsubscribe": [key]})
+
+    def _send(self, msg):
+        data = (json.dumps(msg) + "\n").encode('utf-8')
+        with self.send_mutex:
+            # Try sending the request until successful
+            while True:
+                success, error = self.ls.send_object(data)
+                if error:
+                    return RemoteObjectError(error)
+                if success:
+                    return None
+                print("Could not send msg successfully to server")
+
+    # updates arrive as newline delimited replies tagged with their key
+    def _read_updates(self):
+        buffer = b""
+        while self.running:
+            success, data = self.ls.recieve_object()
+            if not success:
+                break
+
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                try:
+                    reply = json.loads(line.decode('utf-8'))
+                except Exception as e:
+                    print(f"Error parsing update: {e}")
+                    continue
+
+                with self.mutex:
+                    callback = self.callbacks.get(reply.get("Key"))
+                if callback:
+                    callback(reply.get("Result"), reply.get("Error"))
+
+        self.running = False
+
+    def isRunning(self):
+        return self.running
+
+    def close(self):
+        self.running = False
+        if self.ls:
+            try:
+                self.ls.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.ls.close()
+
+def newSubscriber(address, lossy, delayed):
+    subscriber = Subscriber(address, lossy, delayed)
+    err = subscriber.start()
+    if err:
+        return None, err
+
+    return subscriber, None
+
+# Convenience for watching a single method on its own connection
+def subscribe(address, method_name, args, callback, ms_interval, lossy, delayed):
+    subscriber, err = newSubscriber(address, lossy, delayed)
+    if err:
+        return None, err
+
+    _, err = subscriber.watch(method_name, args, callback, ms_interval)
+    if err:
+        subscriber.close()
+        return None, err
+
+    return subscriber, None
+
+# Send a single request to the service and wait for its reply, returning the
+# reply's result or its error
+def _request(address, req, lossy, delayed):
+    conn = None
+    try:
+        host, port = address.split(':')
+        conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        conn.connect((host, int(port)))
+        ls = LeakySocket(conn, lossy, delayed)
+        msg = json.dumps(req).encode('utf-8')
+
+        # Try sending the request until successful
+        while True:
+            success, error = ls.send_object(msg)
+            if error:
+                return None, RemoteObjectError(error)
+            if success:
+                break
+            print("Could not send msg successfully to server")
+
+        success, data = ls.recieve_object()
+        if not success:
+            return None, RemoteObjectError(data or "Connection closed by server")
+
+        reply = json.loads(data.decode('utf-8'))
+        if reply.get("Error"):
+            return None, RemoteObjectError(reply["Error"])
+        return reply.get("Result"), None
+
+    except Exception as e:
+        print(f"Connection error: {e}")
+        return None, RemoteObjectError(str(e))
+    finally:
+        if conn:
+            conn.close()
+
+# Change the profiling mode of a running service, the output file can only be
+# chosen where the service is created. Returns the service's profiling config
+def setRemoteProfiling(address, sample_rate, fmt, ms_stack_interval, flush, lossy, delayed):
+    req = {"control": "profile", "flush": flush}
+    if sample_rate is not None:
+        req.update({"rate": sample_rate, "format": fmt, "stack_interval": ms_stack_interval})
+    return _request(address, req, lossy, delayed)
+
+# Wait at a named rendezvous on the service until all parties have arrived,
+# returning the generation the participants met in. The first caller fixes the
+# number of parties and the timeout of the name, later callers must match them
+def rendezvous(address, name, parties, ms_timeout, lossy, delayed, generation=None):
+    req = {"rendezvous": name, "parties": parties, "timeout": ms_timeout, "generation": generation}
+    # Blocks until the rendezvous is released or times out
+    return _request(address, req, lossy, delayed)
+
+
+
+
+
+
+# Shared by every stub created in this process
+stub_profiler = Profiler("stub")
+
+def setStubProfiling(sample_rate, output=None, fmt=None, ms_stack_interval=None):
+    if output is not None:
+        stub_profiler.setOutput(output)
+    stub_profiler.setProfiling(sample_rate, fmt, ms_stack_interval)
 
 def stubFactory(ifc, address, lossy, delayed):
     if not ifc:
@@ -268,7 +966,12 @@ def stubFactory(ifc, address, lossy, delayed):
 
         def create_dynamic_method(method_name, signature):
             def dynamic_method(self, *args, **kwargs):
+                sample = None
+                conn = None
                 try:
+                    sample = stub_profiler.sample(method_name) if stub_profiler.sample_rate else None
+                    if sample:
+                        sample.mark("connect")
                     # Create connection with server
                     host, port = address.split(':')
                     conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -286,6 +989,8 @@ def stubFactory(ifc, address, lossy, delayed):
                     )
                     
                     # Marshal the request
+                    if sample:
+                        sample.mark("encode")
                     try:
                         msg = json.dumps(req.__dict__).encode('utf-8')
                     except Exception as e:
@@ -293,6 +998,8 @@ def stubFactory(ifc, address, lossy, delayed):
                         return make_zero_return_values_with_error(signature)
                     
                      # Try sending the request until successful
+                    if sample:
+                        sample.mark("send")
                     while True:
                         success, error = ls.send_object(msg)
                         if not success:
@@ -301,26 +1008,36 @@ def stubFactory(ifc, address, lossy, delayed):
                             break
                     
                      # Receive the response (blocking)
+                    if sample:
+                        sample.mark("recv")
                     try:
-                        result_bytes = ls.recv_object()
+                        success, result_bytes = ls.recieve_object()
+                        if not success:
+                            raise RemoteObjectError(result_bytes or "connection closed by server")
                         reply_dict = json.loads(result_bytes.decode('utf-8'))
-                        reply = ReplyMsg(**reply_dict)
+
+                        # the service replies with the method's result and error
+                        result = reply_dict.get("Result")
+                        if result is not None and not isinstance(result, list):
+                            result = [result]
+                        reply = ReplyMsg(success=reply_dict.get("Error") is None, reply=result)
                     except Exception as e:
                         print(f"Error receiving/parsing response: {e}")
                         return make_zero_return_values_with_error(signature)
                     
                     # Process reply
-                    if reply.reply is not None:
-                        if not reply.success:
-                            return make_zero_return_values_with_error(signature)
-                        
-                        # Return the reply values
-                        if len(reply.reply) == 1:
-                            return reply.reply[0]
-                        else:
-                            return tuple(reply.reply)
-                    
-                    return make_zero_return_values_with_error(signature)
+                    if not reply.success:
+                        return make_zero_return_values_with_error(signature)
+
+                    # a method without results replies with None
+                    if reply.reply is None:
+                        return None
+
+                    # Return the reply values
+                    if len(reply.reply) == 1:
+                        return reply.reply[0]
+                    else:
+                        return tuple(reply.reply)
                     
                 except Exception as e:
                     print(f"Connection error: {e}")
@@ -330,6 +1047,8 @@ def stubFactory(ifc, address, lossy, delayed):
                         conn.close()
                     except:
                         pass
+                    if sample:
+                        stub_profiler.record(sample)
             
             return dynamic_method
         # Set the dynamic method on the interface object
@@ -344,7 +1063,7 @@ def make_zero_return_values_with_error(signature):
     if return_annotation is inspect.Signature.empty:
         return zero_vals
     
-    return_types = return_annotation.__args__
+    return_types = getattr(return_annotation, '__args__', [return_annotation])
 
     for return_type in return_types:
         if return_type == RemoteObjectError or return_type is RemoteObjectError:
@@ -1,10 +1,16 @@
 from threading import Lock, Condition, Event
 from typing import Callable, Tuple, Optional
+import json
+import os
 import socket
+import tempfile
+import time
 import random
 import unittest
 import threading
-from remote import newService
+import remote
+from profiler import Profiler
+from remote import newService, newSubscriber, subscribe, rendezvous, setRemoteProfiling, Service, Rendezvous
 
 class RemoteObjectError(Exception):
     """Custom exception for remote object errors"""
@@ -30,14 +36,12 @@ class SimpleObject:
     
     Attributes:
         _mu: A thread lock for synchronization
-        _wake: Flag set by first call, then wait until second call
-        _wg: WaitGroup for synchronizing two threads
+        _meeting: Two party rendezvous shared by concurrent callers
     """
     
     def __init__(self):
         self._mu = Lock()
-        self._wake = False
-        self._wg = threading.Event()  # Using Event as a WaitGroup equivalent
+        self._meeting = Rendezvous(2, 5000)
         
     def method(self, value, return_error):
         """
@@ -58,20 +62,17 @@ class SimpleObject:
     def rendezvous(self):
         """
         Method used to coordinate concurrent calls to the same service.
-        First call sets the wake flag, second call waits for it.
+        Each call waits until a second call arrives, then both return.
+        A call left without a partner for 5 seconds returns an error.
         """
-        with self._mu:
-            if not self._wake:
-                self._wake = True
-                self._wg.set()  # Signal waiting threads
-            else:
-                self._wg.wait()  # Wait until wake is set
+        _, err = self._meeting.wait()
+        return err
 
-    def wake(self):
+    def reset(self):
         """
-        Method to wake waiting threads
+        Method without results, used to check empty replies
         """
-        self._wg.set()
+        return None
     
 class RemoteObjectError(Exception):
     """Custom exception for remote object errors"""
@@ -149,6 +150,40 @@ def probe(port):
         return False
 
 
+def request(port, req):
+    """
+    Helper function that makes a single raw request to the service
+    """
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as s:
+        s.sendall(json.dumps(req).encode())
+        return json.loads(s.recv(4096).decode())
+
+
+def call(port, method, args):
+    return request(port, {"method": method, "args": args})
+
+
+def start_service(test, sobj=None, lossy=False):
+    """
+    Helper function that starts a service on a random port for a test case
+    and stops it again when the test finishes
+
+    Returns:
+        The running service and its address
+    """
+    # Retry on another port if the random one happens to be taken
+    for _ in range(5):
+        port = random.randint(7000, 17000)
+        service = Service(SimpleInterface, sobj or SimpleObject(), port, lossy, False)
+        service.setPublishInterval(10)
+        if service.start() is None:
+            break
+    else:
+        test.fail("Could not start the service on a free port")
+    test.addCleanup(service.stop)
+    return service, "127.0.0.1:%d" % port
+
+
 def test_checkpoint_service_interface():
     """
     Test function to verify service interface validation
@@ -181,6 +216,386 @@ def test_checkpoint_service_interface():
     suite = unittest.TestLoader().loadTestsFromTestCase(TestServiceInterface)
     unittest.TextTestRunner(verbosity=2).run(suite)
 
+class Updates:
+    """Collects pushed updates so that tests can wait for them"""
+
+    def __init__(self):
+        self.values = []
+        self.cond = Condition()
+
+    def __call__(self, result, error):
+        with self.cond:
+            self.values.append((result, error))
+            self.cond.notify_all()
+
+    def wait(self, count, timeout=5):
+        with self.cond:
+            return self.cond.wait_for(lambda: len(self.values) >= count, timeout=timeout)
+
+
+class BlockingObject:
+    """Service object with a method that never returns while blocked"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def block(self, index=0):
+        self.release.wait()
+        return True
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestSubscriptions(unittest.TestCase):
+    """Verify that subscribers receive pushed updates"""
+
+    def test_subscribe_updates(self):
+        service, address = start_service(self)
+        updates = Updates()
+        subscriber, err = subscribe(address, "getCount", [], updates, 10, False, False)
+        self.assertIsNone(err)
+        self.addCleanup(subscriber.close)
+
+        # First value is pushed as soon as the subscription is registered
+        self.assertTrue(updates.wait(1))
+        self.assertEqual(updates.values[0], (0, None))
+
+        # Changes are pushed without the client polling
+        with service.mutex:
+            service.call_count += 1
+        self.assertTrue(updates.wait(2))
+        self.assertEqual(updates.values[-1], (1, None))
+
+        # Unchanged values are not resent
+        count = len(updates.values)
+        time.sleep(0.1)
+        self.assertEqual(len(updates.values), count)
+
+    def test_many_subscriptions_one_connection(self):
+        service, address = start_service(self)
+        subscriber, err = newSubscriber(address, False, False)
+        self.assertIsNone(err)
+        self.addCleanup(subscriber.close)
+
+        count, running, method = Updates(), Updates(), Updates()
+        for name, args, updates in (("getCount", [], count), ("isRunning", [], running), ("method", [3, False], method)):
+            _, err = subscriber.watch(name, args, updates)
+            self.assertIsNone(err)
+
+        self.assertTrue(count.wait(1) and running.wait(1) and method.wait(1))
+        self.assertEqual(count.values[0], (0, None))
+        self.assertEqual(running.values[0], (True, None))
+        self.assertEqual(method.values[0], ([3, ""], None))
+        self.assertEqual(len({sub.channel for sub in service.subscriptions}), 1)
+
+    def test_close_removes_subscriptions(self):
+        service, address = start_service(self)
+        updates = Updates()
+        subscriber, err = subscribe(address, "isRunning", [], updates, None, False, False)
+        self.assertIsNone(err)
+        self.assertTrue(updates.wait(1))
+        self.assertEqual(len(service.subscriptions), 1)
+
+        # The service notices the hang up even though the value never changes
+        subscriber.close()
+        self.assertTrue(wait_until(lambda: not service.subscriptions))
+
+    def test_invalid_interval(self):
+        _, address = start_service(self)
+        subscriber, err = newSubscriber(address, False, False)
+        self.assertIsNone(err)
+        self.addCleanup(subscriber.close)
+
+        _, err = subscriber.watch("getCount", [], Updates(), "fast")
+        self.assertIsNotNone(err)
+
+        # Unknown methods are reported on the subscription
+        updates = Updates()
+        _, err = subscriber.watch("missing", [], updates)
+        self.assertIsNone(err)
+        self.assertTrue(updates.wait(1))
+        self.assertIsNone(updates.values[0][0])
+        self.assertIsNotNone(updates.values[0][1])
+
+    def test_slow_method_isolated(self):
+        sobj = BlockingObject()
+        self.addCleanup(sobj.release.set)
+        service, address = start_service(self, sobj)
+        service.setEvaluationTimeout(50)
+        subscriber, err = newSubscriber(address, False, False)
+        self.assertIsNone(err)
+        self.addCleanup(subscriber.close)
+
+        blocked, count = Updates(), Updates()
+        subscriber.watch("block", [], blocked)
+        subscriber.watch("getCount", [], count)
+
+        # A method that never returns does not hold up other subscriptions
+        self.assertTrue(count.wait(1))
+        self.assertEqual(count.values[0], (0, None))
+        self.assertTrue(blocked.wait(1))
+        self.assertIsNone(blocked.values[0][0])
+        self.assertIn("timed out", blocked.values[0][1])
+
+        sobj.release.set()
+        self.assertTrue(blocked.wait(2))
+        self.assertEqual(blocked.values[-1], (True, None))
+
+
+    def test_stuck_methods_do_not_exhaust_workers(self):
+        sobj = BlockingObject()
+        self.addCleanup(sobj.release.set)
+        service, address = start_service(self, sobj)
+        service.setEvaluationTimeout(50)
+        subscriber, err = newSubscriber(address, False, False)
+        self.assertIsNone(err)
+        self.addCleanup(subscriber.close)
+
+        # More blocked methods than there are evaluator workers
+        blocked = [Updates() for _ in range(service.eval_workers + 2)]
+        for index, updates in enumerate(blocked):
+            subscriber.watch("block", [index], updates)
+        for updates in blocked:
+            self.assertTrue(updates.wait(1))
+
+        count = Updates()
+        subscriber.watch("getCount", [], count)
+        self.assertTrue(count.wait(1))
+        self.assertEqual(count.values[0], (0, None))
+
+    def test_stop_closes_idle_subscribers(self):
+        service, address = start_service(self)
+        subscriber, err = newSubscriber(address, False, False)
+        self.assertIsNone(err)
+        self.addCleanup(subscriber.close)
+        self.assertTrue(wait_until(lambda: service.channels))
+
+        # A connection without any subscriptions is closed as well
+        service.stop()
+        self.assertTrue(wait_until(lambda: not subscriber.isRunning()))
+
+
+class TestRendezvous(unittest.TestCase):
+    """Verify N party rendezvous through the service"""
+
+    def meet(self, address, name, parties, lossy=False):
+        results = []
+        results_mu = Lock()
+
+        def participant():
+            outcome = rendezvous(address, name, parties, 5000, lossy, False)
+            with results_mu:
+                results.append(outcome)
+
+        threads = [threading.Thread(target=participant) for _ in range(parties)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        return results
+
+    def test_rendezvous_release(self):
+        _, address = start_service(self)
+        parties = 20
+
+        # Every participant of a generation is released together
+        for generation in range(2):
+            self.assertEqual(self.meet(address, "meet", parties), [(generation, None)] * parties)
+
+        # A generation that does not fill up in time is broken
+        generation, err = rendezvous(address, "lonely", 2, 50, False, False)
+        self.assertIsNone(generation)
+        self.assertIsNotNone(err)
+
+        # Joining a generation that has already been released fails
+        generation, err = rendezvous(address, "meet", parties, 5000, False, False, generation=0)
+        self.assertIsNone(generation)
+        self.assertIsNotNone(err)
+
+    def test_invalid_settings(self):
+        service, address = start_service(self)
+
+        # Bad settings are rejected without creating the point
+        for name, parties, timeout in (("bad", "x", None), ("bad", -3, None), ("bad", 2, "soon"), ("bad", True, None)):
+            generation, err = rendezvous(address, name, parties, timeout, False, False)
+            self.assertIsNone(generation)
+            self.assertIsNotNone(err)
+
+        # Settings fixed by the first caller are enforced for later callers
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(rendezvous(address, "bad", 2, 5000, False, False)))
+        waiter.start()
+        self.assertTrue(wait_until(lambda: service.rendezvous_points.get("bad") and service.rendezvous_points["bad"].waiters))
+        _, err = rendezvous(address, "bad", 2, 100, False, False)
+        self.assertIsNotNone(err)
+        self.assertEqual(rendezvous(address, "bad", 2, 5000, False, False), (0, None))
+        waiter.join(5)
+        self.assertEqual(results, [(0, None)])
+
+    def test_lossy_release(self):
+        _, address = start_service(self, lossy=True)
+        parties = 20
+        self.assertEqual(self.meet(address, "meet", parties, lossy=True), [(0, None)] * parties)
+
+    def test_stop_releases_waiters(self):
+        service, address = start_service(self)
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(rendezvous(address, "meet", 2, None, False, False)))
+        waiter.start()
+        self.assertTrue(wait_until(lambda: service.rendezvous_points.get("meet") and service.rendezvous_points["meet"].waiters))
+
+        service.stop()
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertIsNone(results[0][0])
+        self.assertIsNotNone(results[0][1])
+
+    def test_object_rendezvous_timeout(self):
+        sobj = SimpleObject()
+        sobj._meeting = Rendezvous(2, 50)
+        self.assertIsNotNone(sobj.rendezvous())
+
+        # Each object has its own meeting point
+        other = SimpleObject()
+        outcome = []
+        t = threading.Thread(target=lambda: outcome.append(other.rendezvous()))
+        t.start()
+        self.assertIsNone(other.rendezvous())
+        t.join(5)
+        self.assertEqual(outcome, [None])
+        self.assertEqual(sobj._meeting.generation, 1)
+
+
+def stub_interface():
+    """
+    Helper function returning a fresh remote interface matching SimpleObject,
+    stubFactory replaces the methods of the class it is given
+    """
+    class StubInterface:
+        def method(self, value: int, return_error: bool) -> Tuple[int, str, remote.RemoteObjectError]:
+            pass
+
+        def reset(self) -> remote.RemoteObjectError:
+            pass
+
+        def missing(self) -> remote.RemoteObjectError:
+            pass
+
+    return StubInterface
+
+
+class TestProfiling(unittest.TestCase):
+    """Verify request profiling toggled through the control method"""
+
+    def test_profile_toggle(self):
+        output = os.path.join(tempfile.mkdtemp(), "service.folded")
+        service, address = start_service(self)
+        service.setProfiling(0.0, output=output)
+        port = service.port
+
+        # Nothing is recorded while profiling is off
+        self.assertEqual(call(port, "method", [5, False])["Result"], [5, ""])
+        self.assertEqual(service.profiler.folded, {})
+
+        config, err = setRemoteProfiling(address, 1.0, "folded", 0, False, False, False)
+        self.assertIsNone(err)
+        self.assertEqual(config["rate"], 1.0)
+
+        call(port, "method", [5, False])
+        config, err = setRemoteProfiling(address, 0.0, None, None, True, False, False)
+        self.assertIsNone(err)
+        self.assertEqual(config["rate"], 0.0)
+
+        with open(output) as f:
+            phases = [line.split()[0] for line in f]
+        for phase in ("recv", "decode", "resolve", "call", "send", "count"):
+            self.assertIn("service;method;" + phase, phases)
+
+    def test_invalid_settings(self):
+        service, address = start_service(self)
+        port = service.port
+
+        # Unknown formats and badly typed settings are reported back as errors
+        for rate, fmt, interval in ((1.0, "svg", 0), ("0.5", None, None), (2, None, None), (1.0, None, "1"), (1.0, None, -1)):
+            _, err = setRemoteProfiling(address, rate, fmt, interval, False, False, False)
+            self.assertIsNotNone(err)
+        self.assertEqual(service.profiler.sample_rate, 0.0)
+        self.assertEqual(call(port, "method", [5, False])["Result"], [5, ""])
+
+        # Unknown controls are reported back as errors
+        self.assertIsNotNone(request(port, {"control": "bogus"})["Error"])
+
+    def test_trace_events_bounded(self):
+        profiler = Profiler("service", 1.0, None, "trace", 0, max_events=10)
+        for _ in range(20):
+            sample = profiler.sample("method")
+            sample.mark("call")
+            profiler.record(sample)
+        self.assertEqual(len(profiler.events), 10)
+
+    def test_trace_stack_samples(self):
+        profiler = Profiler("service", 1.0, None, "trace", 1)
+
+        def work():
+            time.sleep(0.02)
+
+        sample = profiler.sample("method")
+        sample.mark("call")
+        work()
+        profiler.record(sample)
+
+        # Stack samples are written as trace events, not only as folded stacks
+        names = [event["name"] for event in profiler.events]
+        self.assertTrue(any(name.endswith(":work") for name in names))
+
+    def test_control_requests_not_sampled(self):
+        service, address = start_service(self)
+        service.setProfiling(1.0)
+        setRemoteProfiling(address, 1.0, None, None, False, False, False)
+        rendezvous(address, "alone", 1, None, False, False)
+        call(service.port, "method", [5, False])
+        self.assertTrue(wait_until(lambda: service.profiler.folded))
+        self.assertFalse([key for key in service.profiler.folded if ";unknown;" in key])
+
+    def test_stub_replies(self):
+        _, address = start_service(self)
+        StubInterface = stub_interface()
+        remote.stubFactory(StubInterface, address, False, False)
+
+        # A successful call without results returns None
+        self.assertIsNone(StubInterface().reset())
+
+        # A failed call returns the zero values with an error
+        result = StubInterface().missing()
+        self.assertEqual(len(result), 1)
+        self.assertIsInstance(result[0], remote.RemoteObjectError)
+
+    def test_stub_profiling(self):
+        _, address = start_service(self)
+        output = os.path.join(tempfile.mkdtemp(), "stub.folded")
+        remote.setStubProfiling(1.0, output=output)
+        self.addCleanup(remote.setStubProfiling, 0.0)
+        self.addCleanup(remote.stub_profiler.folded.clear)
+
+        StubInterface = stub_interface()
+        remote.stubFactory(StubInterface, address, False, False)
+        self.assertEqual(StubInterface().method(5, False), (5, ""))
+        self.assertIsNone(remote.stub_profiler.flush())
+
+        with open(output) as f:
+            phases = [line.split()[0] for line in f]
+        for phase in ("connect", "encode", "send", "recv"):
+            self.assertIn("stub;method;" + phase, phases)
+
+
 # Add this to run the test when the file is executed directly
 if __name__ == "__main__":
     test_checkpoint_service_interface()
+    unittest.main()
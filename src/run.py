@@ -3,6 +3,7 @@ Test suite for RMI Calculator Service
 This script tests the connectivity and communication between the server and client
 for the RMI calculator implementation.
 '''
+import threading
 import unittest
 from calcObject import calcObject
 
@@ -68,5 +69,17 @@ class TestCalculator(unittest.TestCase):
         count, _ = self.calc.usage()
         self.assertEqual(count, initial_count + 3)
 
+    def test_rendezvous(self):
+        """Test that two concurrent callers meet and a lone caller times out"""
+        results = []
+        caller = threading.Thread(target=lambda: results.append(self.calc.rendezvous()))
+        caller.start()
+        self.assertIsNone(self.calc.rendezvous())
+        caller.join(5)
+        self.assertEqual(results, [None])
+
+        lonely = calcObject(50)
+        self.assertIsNotNone(lonely.rendezvous())
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file